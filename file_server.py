@@ -9,8 +9,21 @@ import sys
 import argparse
 import socket
 import mimetypes
-import chardet  # 需要先安装: pip install chardet
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import functools
+import email.utils
+import datetime
+import re
+
+# 编码检测库：优先使用速度更快的cchardet，其次charset_normalizer，最后回退到chardet
+try:
+    import cchardet as _det  # pip install cchardet
+except ImportError:
+    try:
+        import charset_normalizer as _det
+    except ImportError:
+        import chardet as _det  # 需要先安装: pip install chardet
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 from urllib.parse import unquote, quote, parse_qs
 import json
 
@@ -23,123 +36,22 @@ mimetypes.add_type('text/css', '.css')
 mimetypes.add_type('application/javascript', '.js')
 mimetypes.add_type('text/markdown', '.md')
 
-class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
-    """自定义HTTP请求处理器，支持目录访问和文件服务"""
-    
-    def __init__(self, *args, directory=None, **kwargs):
-        self.directory = directory
-        super().__init__(*args, **kwargs)
-    
-    def translate_path(self, path):
-        """重写路径转换方法，支持自定义根目录"""
-        # 解析查询参数
-        if '?' in path:
-            path, query = path.split('?', 1)
-        else:
-            query = ''
-        
-        # 解码URL编码的路径（使用UTF-8）
-        try:
-            path = unquote(path, encoding='utf-8', errors='replace')
-        except:
-            path = unquote(path)
-        
-        # 如果是根路径，返回目录列表
-        if path == '/':
-            return self.directory if self.directory else os.getcwd()
-        
-        # 处理上级目录访问
-        if '..' in path:
-            self.send_error(403, "访问上级目录被禁止")
-            return None
-        
-        # 构建完整路径
-        if self.directory:
-            full_path = os.path.join(self.directory, path.lstrip('/'))
-        else:
-            full_path = os.path.join(os.getcwd(), path.lstrip('/'))
-        
-        # 规范化路径
-        full_path = os.path.normpath(full_path)
-        
-        # 检查路径是否在指定目录内
-        if self.directory and not full_path.startswith(os.path.abspath(self.directory)):
-            self.send_error(403, "访问根目录外的文件被禁止")
-            return None
-        
-        return full_path
-    
-    def do_GET(self):
-        """处理GET请求"""
-        # 获取请求路径
-        path = self.translate_path(self.path)
-        
-        # 如果路径无效，直接返回
-        if path is None:
-            return
-        
-        # 检查路径是否存在
-        if not os.path.exists(path):
-            self.send_error(404, "文件未找到")
-            return
-        
-        # 如果是目录，显示目录列表
-        if os.path.isdir(path):
-            self.send_directory_listing(path)
-            return
-        
-        # 如果是文件，根据类型处理
-        self.send_file(path)
-    
-    def send_directory_listing(self, path):
-        """发送目录列表页面"""
-        try:
-            # 获取目录内容
-            files = os.listdir(path)
-            files.sort()
-            
-            # 生成HTML页面
-            html = self.generate_directory_html(path, files)
-            
-            # 发送响应
-            self.send_response(200)
-            self.send_header("Content-type", "text/html; charset=utf-8")
-            self.send_header("Content-Length", str(len(html.encode('utf-8'))))
-            self.end_headers()
-            self.wfile.write(html.encode('utf-8'))
-            
-        except PermissionError:
-            self.send_error(403, "权限被拒绝")
-        except Exception as e:
-            self.send_error(500, f"内部服务器错误: {str(e)}")
-    
-    def generate_directory_html(self, path, files):
-        """生成目录列表HTML"""
-        # 相对路径
-        if self.directory:
-            rel_path = os.path.relpath(path, self.directory)
-            if rel_path == '.':
-                rel_path = ''
-        else:
-            rel_path = self.path
-        
-        # 尝试获取IP地址
-        try:
-            # 获取本机IP地址
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(('8.8.8.8', 80))
-            local_ip = s.getsockname()[0]
-            s.close()
-        except:
-            local_ip = "127.0.0.1"
-        
-        # 构建HTML
-        html = f"""<!DOCTYPE html>
+# 按文本方式处理的MIME类型前缀
+TEXT_CONTENT_TYPES = ('text/', 'application/json', 'application/xml', 'application/javascript')
+
+# 已知的二进制文件扩展名，目录列表中不检测其编码
+BINARY_EXTENSIONS = frozenset((
+    '.zip', '.png', '.jpg', '.jpeg', '.gif', '.mp4', '.mp3', '.pdf', '.exe', '.so',
+    '.dll', '.bin', '.7z', '.gz', '.tar', '.webp', '.woff', '.woff2', '.ico',
+))
+
+# 目录列表页面模板（在模块加载时构建一次，每次请求只做占位符替换）
+DIRECTORY_HEADER_TEMPLATE = """<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>文件服务器 - {self.html_escape(os.path.basename(path) if os.path.basename(path) else '根目录')}</title>
+    <title>文件服务器 - {title}</title>
     <style>
         body {{
             font-family: 'Segoe UI', 'Microsoft YaHei', sans-serif;
@@ -262,66 +174,34 @@ class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
         <div class="header">
             <h1>📁 文件服务器</h1>
             <div class="server-info">
-                当前目录: {self.html_escape(path)}<br>
-                IP: {local_ip}
+                当前目录: {path}<br>
+                IP: {ip}
             </div>
         </div>
         
         <div class="path-info">
-            📍 路径: /{self.html_escape(rel_path if rel_path else '')}
+            📍 路径: /{rel_path}
         </div>
         
         <ul class="file-list">
             <!-- 上级目录链接 -->
-            {self.generate_parent_link(path)}
+            {parent_link}
 """
-        
-        # 添加文件列表
-        for file in files:
-            file_path = os.path.join(path, file)
-            is_dir = os.path.isdir(file_path)
-            file_size = ""
-            encoding_info = ""
-            
-            if not is_dir:
-                try:
-                    size = os.path.getsize(file_path)
-                    file_size = self.format_size(size)
-                    
-                    # 检测文件编码
-                    encoding = self.detect_file_encoding(file_path)
-                    if encoding and encoding.lower() != 'utf-8':
-                        encoding_info = f'<span class="encoding-badge">{encoding}</span>'
-                except:
-                    file_size = "未知"
-                    
-            file_icon = "📁" if is_dir else "📄"
-            
-            # 相对URL路径
-            if rel_path:
-                file_url = f"/{rel_path}/{file}" if rel_path else f"/{file}"
-            else:
-                file_url = f"/{file}"
-            
-            # 清理URL中的双斜杠
-            file_url = file_url.replace('//', '/')
-            # 对URL进行UTF-8编码
-            encoded_file_url = quote(file_url.encode('utf-8'))
-            
-            html += f"""            <li class="file-item">
-                <div class="file-icon">{file_icon}</div>
+
+DIRECTORY_ITEM_TEMPLATE = """            <li class="file-item">
+                <div class="file-icon">{icon}</div>
                 <div class="file-name">
-                    <a href="{encoded_file_url}">{self.html_escape(file)}</a>{encoding_info}
+                    <a href="{url}">{name}</a>{encoding_info}
                     <span class="action-buttons">
-                        <button class="action-btn" onclick="viewFile('{encoded_file_url}')">查看</button>
-                        <button class="action-btn" onclick="downloadFile('{encoded_file_url}')">下载</button>
+                        <button class="action-btn" onclick="viewFile('{url}')">查看</button>
+                        <button class="action-btn" onclick="downloadFile('{url}')">下载</button>
                     </span>
                 </div>
-                <div class="file-size">{file_size}</div>
+                <div class="file-size">{size}</div>
             </li>
 """
-        
-        html += """        </ul>
+
+DIRECTORY_FOOTER_HTML = """        </ul>
         
         <div class="encoding-info">
             ℹ️ 编码提示：服务器会自动检测文件编码并转换为UTF-8显示。如果中文显示乱码，请在浏览器中检查编码设置是否正确。
@@ -350,28 +230,340 @@ class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
     </script>
 </body>
 </html>"""
+
+# 路径中的上级目录片段（..），同时匹配Windows路径分隔符
+_TRAVERSAL_RE = re.compile(r'(^|[/\\])\.\.([/\\]|$)')
+
+# 请求行或请求头解析失败时父类返回的错误码（请求过长、请求头过大、协议版本不支持等）
+PROTOCOL_ERROR_CODES = frozenset((400, 414, 431, 505))
+
+# 文件大小单位
+SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
+# 目录列表分块传输时每个分块的目标大小
+LISTING_CHUNK_SIZE = 16 * 1024
+
+# 单一范围的Range请求头，如 bytes=0-499、bytes=500-、bytes=-500
+_RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+
+# 无需URL编码的路径（仅包含非保留字符和斜杠）
+_SAFE_URL_RE = re.compile(r'[A-Za-z0-9._~\-/]+')
+
+@functools.lru_cache(maxsize=8192)
+def quote_url(url):
+    """对URL路径进行UTF-8编码，纯ASCII安全字符直接返回"""
+    if _SAFE_URL_RE.fullmatch(url):
+        return url
+    return quote(url.encode('utf-8'))
+
+@functools.lru_cache(maxsize=1024)
+def _guess_by_ext(ext):
+    """按扩展名获取MIME类型（结果缓存）"""
+    return mimetypes.types_map.get(ext) or mimetypes.guess_type('x' + ext)[0]
+
+# 文件名中ASCII范围内的不安全字符（字母、数字和 _-.() 以外）替换为下划线
+_FILENAME_TABLE = str.maketrans({
+    chr(cp): '_' for cp in range(128)
+    if not (chr(cp).isalnum() or chr(cp) in '_-.()')
+})
+
+def sanitize_filename(filename):
+    """将文件名中的不安全字符替换为下划线，保留各语言的文字和数字"""
+    safe_filename = filename.translate(_FILENAME_TABLE)
+    if safe_filename.isascii():
+        return safe_filename
+    # 非ASCII字符：保留文字、数字和中文，其余替换为下划线
+    return ''.join(
+        ch if ch.isascii() or ch.isalnum() or '\u4e00' <= ch <= '\u9fff' else '_'
+        for ch in safe_filename
+    )
+
+def detect_encoding(raw_data):
+    """检测字节数据的编码，返回 (encoding, confidence)"""
+    result = _det.detect(raw_data)
+    return result.get('encoding'), result.get('confidence') or 0
+
+# 目录列表编码检测使用的共享线程池（线程按需创建并在请求间复用）
+_ENCODING_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix='encoding')
+
+@functools.lru_cache(maxsize=4096)
+def _cached_encoding(path, mtime_ns, size, sample_size=1024):
+    """按 (路径, 修改时间, 大小) 缓存文件编码检测结果"""
+    with open(path, 'rb') as f:
+        raw_data = f.read(sample_size)
+    
+    if not raw_data:
+        return None
+    
+    encoding, confidence = detect_encoding(raw_data)
+    
+    # 如果置信度太低，返回None
+    if confidence < 0.5:
+        return None
+    
+    return encoding
+
+class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
+    """自定义HTTP请求处理器，支持目录访问和文件服务"""
+    
+    # 使用HTTP/1.1以支持长连接，所有响应都需设置Content-Length
+    protocol_version = 'HTTP/1.1'
+    
+    # HTML转义表，str.translate 只需对字符串进行一次扫描
+    _HTML_TRANS = str.maketrans({
+        '&': '&amp;',
+        '<': '&lt;',
+        '>': '&gt;',
+        '"': '&quot;',
+        "'": '&#39;',
+    })
+    
+    def __init__(self, *args, directory=None, root_abs=None, **kwargs):
+        # 根目录的绝对路径在服务器启动时计算一次，避免每个请求重复计算
+        # 注意：父类在__init__中就会处理请求，因此必须在调用父类之前设置
+        self._root_abs = root_abs or os.path.abspath(directory or os.getcwd())
+        super().__init__(*args, directory=directory, **kwargs)
+    
+    def parse_request(self):
+        """解析请求头；带请求体的请求处理完后关闭连接（服务器不读取请求体）"""
+        if not super().parse_request():
+            # 请求行或请求头解析失败（如400、431），剩余数据无法可靠地分隔，必须关闭连接
+            self.close_connection = True
+            return False
+        content_length = self.headers.get('Content-Length', '').strip()
+        if self.headers.get('Transfer-Encoding') or content_length not in ('', '0'):
+            self.close_connection = True
+        return True
+    
+    def send_response(self, code, message=None):
+        """发送状态行；需要关闭连接时告知客户端"""
+        super().send_response(code, message)
+        if self.close_connection:
+            self.send_header("Connection", "close")
+    
+    def translate_path(self, path):
+        """重写路径转换方法，支持自定义根目录"""
+        # 快速路径：绝大多数请求是不含查询参数、URL编码和上级目录的纯ASCII路径，
+        # 无需解码和规范化，直接拼接到根目录（排除反斜杠和冒号，避免Windows盘符路径）
+        if (path.isascii() and '?' not in path and '%' not in path and '..' not in path
+                and '\\' not in path and ':' not in path):
+            rel = path.strip('/')
+            return os.path.join(self._root_abs, rel) if rel else self._root_abs
+        
+        # 去掉查询参数
+        path = path.split('?', 1)[0]
         
-        return html
+        # 解码URL编码的路径（使用UTF-8）
+        path = unquote(path, encoding='utf-8', errors='replace')
+        
+        # 如果是根路径，返回目录列表
+        if path == '/':
+            return self._root_abs
+        
+        # 处理上级目录访问（在解码后的路径上检查，覆盖%2e%2e等编码形式）
+        if _TRAVERSAL_RE.search(path):
+            self.send_error(403, "访问上级目录被禁止")
+            return None
+        
+        # 构建完整路径并规范化
+        full_path = os.path.normpath(os.path.join(self._root_abs, path.lstrip('/')))
+        
+        # 检查路径是否在指定目录内
+        if not full_path.startswith(self._root_abs):
+            self.send_error(403, "访问根目录外的文件被禁止")
+            return None
+        
+        return full_path
+    
+    def do_GET(self):
+        """处理GET请求"""
+        # 获取请求路径
+        path = self.translate_path(self.path)
+        
+        # 如果路径无效，直接返回
+        if path is None:
+            return
+        
+        # 检查路径是否存在
+        if not os.path.exists(path):
+            self.send_error(404, "文件未找到")
+            return
+        
+        # 如果是目录，显示目录列表
+        if os.path.isdir(path):
+            self.send_directory_listing(path)
+            return
+        
+        # 如果是文件，根据类型处理
+        self.send_file(path)
+    
+    def do_HEAD(self):
+        """处理HEAD请求：返回与GET相同的响应头（含ETag、Range支持和转换后的长度），但不发送内容"""
+        self.do_GET()
     
-    def detect_file_encoding(self, file_path, sample_size=1024):
-        """检测文件编码"""
+    def send_directory_listing(self, path):
+        """发送目录列表页面"""
+        headers_sent = False
         try:
-            with open(file_path, 'rb') as f:
-                raw_data = f.read(sample_size)
+            # 获取目录内容（scandir 会缓存类型和元数据，减少stat调用）
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda e: e.name)
             
-            if not raw_data:
-                return None
+            # 并行检测文本文件编码
+            encodings = self.detect_encodings(entries)
             
-            # 使用chardet检测编码
-            result = chardet.detect(raw_data)
-            encoding = result['encoding']
-            confidence = result['confidence']
+            # 逐段生成HTML页面
+            html_parts = self.generate_directory_html(path, entries, encodings)
             
-            # 如果置信度太低，返回None
-            if confidence < 0.5:
-                return None
+            # HTTP/1.0 客户端不支持分块传输，一次性生成后发送
+            if self.request_version == 'HTTP/1.0':
+                html = ''.join(html_parts).encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(html)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(html)
+                return
+            
+            # 使用分块传输边生成边发送，无需在内存中构建完整页面
+            self.send_response(200)
+            self.send_header("Content-type", "text/html; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            headers_sent = True
+            if self.command == 'HEAD':
+                return
             
-            return encoding
+            # 小片段先缓冲，凑够一定大小再发送一个分块，减少系统调用
+            buffer = []
+            buffered = 0
+            for part in html_parts:
+                data = part.encode('utf-8')
+                buffer.append(data)
+                buffered += len(data)
+                if buffered >= LISTING_CHUNK_SIZE:
+                    self.write_chunk(b''.join(buffer))
+                    buffer = []
+                    buffered = 0
+            if buffer:
+                self.write_chunk(b''.join(buffer))
+            self.wfile.write(b"0\r\n\r\n")
+            
+        except Exception as e:
+            if headers_sent:
+                # 响应头已发送，无法再返回错误页面，只能关闭连接
+                self.close_connection = True
+            elif isinstance(e, PermissionError):
+                self.send_error(403, "权限被拒绝")
+            else:
+                self.send_error(500, f"内部服务器错误: {str(e)}")
+    
+    def write_chunk(self, data):
+        """按分块传输编码发送一段数据"""
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+    
+    def generate_directory_html(self, path, entries, encodings):
+        """逐段生成目录列表HTML（生成器：页头、每个文件条目、页脚）"""
+        # 相对路径
+        if self.directory:
+            rel_path = os.path.relpath(path, self._root_abs)
+            if rel_path == '.':
+                rel_path = ''
+        else:
+            rel_path = self.path
+        
+        # 获取本机IP地址（进程内缓存）
+        local_ip = get_local_ip()
+        
+        yield DIRECTORY_HEADER_TEMPLATE.format(
+            title=self.html_escape(os.path.basename(path) if os.path.basename(path) else '根目录'),
+            path=self.html_escape(path),
+            ip=local_ip,
+            rel_path=self.html_escape(rel_path if rel_path else ''),
+            parent_link=self.generate_parent_link(path),
+        )
+        
+        # 文件URL的公共前缀在循环外计算一次，并清理其中的双斜杠
+        url_prefix = (f"/{rel_path}/" if rel_path else "/").replace('//', '/')
+        
+        # 循环内频繁使用的方法绑定到局部变量，减少属性查找
+        item_format = DIRECTORY_ITEM_TEMPLATE.format
+        escape = self.html_escape
+        format_size = self.format_size
+        
+        # 添加文件列表
+        for entry in entries:
+            file = entry.name
+            is_dir = entry.is_dir()
+            file_size = ""
+            encoding_info = ""
+            
+            if not is_dir:
+                try:
+                    st = entry.stat()
+                    size = st.st_size
+                    file_size = format_size(size)
+                    
+                    # 显示非UTF-8文本文件的编码
+                    encoding = encodings.get(entry.path)
+                    if encoding and encoding.lower() != 'utf-8':
+                        encoding_info = f'<span class="encoding-badge">{escape(encoding)}</span>'
+                except:
+                    file_size = "未知"
+                    
+            file_icon = "📁" if is_dir else "📄"
+            
+            # 相对URL路径，并进行UTF-8编码
+            encoded_file_url = quote_url(url_prefix + file)
+            
+            yield item_format(
+                icon=file_icon,
+                url=encoded_file_url,
+                name=escape(file),
+                encoding_info=encoding_info,
+                size=file_size,
+            )
+        
+        yield DIRECTORY_FOOTER_HTML
+    
+    def detect_encodings(self, entries):
+        """并行检测目录中非空文本文件的编码，返回 {文件路径: 编码}"""
+        probes = []
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            if st.st_size > 0 and self.is_text_candidate(entry.name):
+                probes.append((entry.path, st))
+        
+        # 只有一个文件时无需线程池
+        if len(probes) <= 1:
+            return {file_path: self.detect_file_encoding(file_path, st=st) for file_path, st in probes}
+        
+        results = _ENCODING_EXECUTOR.map(
+            lambda probe: self.detect_file_encoding(probe[0], st=probe[1]), probes
+        )
+        return {file_path: encoding for (file_path, _), encoding in zip(probes, results)}
+    
+    def is_text_candidate(self, filename):
+        """判断文件是否需要检测编码（跳过二进制文件）"""
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in BINARY_EXTENSIONS:
+            return False
+        content_type = _guess_by_ext(ext)
+        return bool(content_type and content_type.startswith(TEXT_CONTENT_TYPES))
+    
+    def detect_file_encoding(self, file_path, sample_size=1024, st=None):
+        """检测文件编码，可传入已获取的stat结果以避免重复调用"""
+        try:
+            # 先获取文件元数据，文件未变化时直接命中缓存，无需读取文件
+            if st is None:
+                st = os.stat(file_path)
+            return _cached_encoding(file_path, st.st_mtime_ns, st.st_size, sample_size)
         except:
             return None
     
@@ -391,14 +583,14 @@ class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
     
     def generate_parent_link(self, current_path):
         """生成上级目录链接"""
-        if self.directory and os.path.abspath(current_path) == os.path.abspath(self.directory):
+        if self.directory and os.path.abspath(current_path) == self._root_abs:
             return ""  # 已经在根目录，不显示上级目录链接
         
         parent_path = os.path.dirname(current_path)
         
         # 计算相对路径
         if self.directory:
-            rel_parent = os.path.relpath(parent_path, self.directory)
+            rel_parent = os.path.relpath(parent_path, self._root_abs)
             if rel_parent == '.':
                 parent_url = '/'
             else:
@@ -411,7 +603,7 @@ class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
                 parent_url = parent_url.rstrip('/')
         
         # 对URL进行UTF-8编码
-        encoded_parent_url = quote(parent_url.encode('utf-8'))
+        encoded_parent_url = quote_url(parent_url)
         
         return f"""            <li class="file-item dir-up">
                 <div class="file-icon">⬆️</div>
@@ -422,27 +614,73 @@ class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
     
     def send_file(self, file_path):
         """发送文件"""
+        headers_sent = False
         try:
-            # 获取文件大小
-            file_size = os.path.getsize(file_path)
+            # 获取文件大小和修改时间
+            st = os.stat(file_path)
+            file_size = st.st_size
+            
+            # 根据文件元数据生成弱ETag，客户端缓存未过期时直接返回304
+            etag = f'W/"{st.st_size:x}-{st.st_mtime_ns:x}"'
+            last_modified = self.date_time_string(st.st_mtime)
+            if self.is_not_modified(etag, st.st_mtime):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+                self.end_headers()
+                return
             
             # 获取文件名
             filename = os.path.basename(file_path)
             
             # 获取MIME类型
-            content_type, _ = mimetypes.guess_type(file_path)
-            if content_type is None:
-                content_type = 'application/octet-stream'
+            ext = os.path.splitext(file_path)[1].lower()
+            content_type = _guess_by_ext(ext) or 'application/octet-stream'
             
             # 检查是否是文本文件
-            is_text_file = content_type.startswith(('text/', 'application/json', 'application/xml', 'application/javascript'))
+            is_text_file = content_type.startswith(TEXT_CONTENT_TYPES)
             
             # 检查URL中是否有download参数
             query_string = self.path.split('?')[1] if '?' in self.path else ''
             download_requested = 'download=true' in query_string
             
+            # 对于查看文本文件，一次读取文件，检测编码并转换为UTF-8
+            utf8_content = None
+            if is_text_file and not download_requested:
+                with open(file_path, 'rb') as f:
+                    file_content = f.read()
+                
+                detected_encoding = None
+                if file_content:
+                    encoding, confidence = detect_encoding(file_content[:4096])
+                    if confidence >= 0.5:
+                        detected_encoding = encoding
+                utf8_content = self.convert_to_utf8(file_content, detected_encoding)
+                
+                # 转换后内容长度可能变化
+                file_size = len(utf8_content)
+            
+            # 处理Range请求（断点续传、媒体拖动播放）
+            byte_range = None
+            range_header = self.headers.get('Range')
+            if range_header and self.if_range_matches(last_modified):
+                byte_range = self.parse_range(range_header, file_size)
+            
+            if byte_range and byte_range[0] >= file_size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{file_size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            
             # 设置响应头
-            self.send_response(200)
+            if byte_range:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{file_size}")
+            else:
+                start, end = 0, file_size - 1
+                self.send_response(200)
             
             # 对于非文本文件或要求下载的情况，设置为附件
             if not is_text_file or download_requested:
@@ -450,8 +688,7 @@ class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
                 # 使用现代浏览器支持的UTF-8文件名编码
                 try:
                     # 移除不安全的字符
-                    import re
-                    safe_filename = re.sub(r'[^\w\-_.()\u4e00-\u9fff]', '_', filename)
+                    safe_filename = sanitize_filename(filename)
                     
                     # 同时提供两种格式的文件名，让浏览器选择
                     encoded_filename = quote(safe_filename.encode('utf-8'), safe='')
@@ -467,38 +704,102 @@ class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
                     content_type = f"{content_type}; charset=utf-8"
             
             self.send_header("Content-type", content_type)
-            self.send_header("Content-Length", str(file_size))
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("Cache-Control", "no-cache")
             self.send_header("Access-Control-Allow-Origin", "*")  # 允许跨域访问
             self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
             self.send_header("Access-Control-Allow-Headers", "*")
             self.end_headers()
+            headers_sent = True
             
-            # 发送文件内容
-            if is_text_file and not download_requested:
-                # 对于查看文本文件，读取并确保UTF-8编码
-                with open(file_path, 'rb') as f:
-                    file_content = f.read()
-                
-                # 检测文件编码并转换为UTF-8
-                detected_encoding = self.detect_file_encoding(file_path)
-                utf8_content = self.convert_to_utf8(file_content, detected_encoding)
-                
-                self.wfile.write(utf8_content)
+            # 发送文件内容（HEAD请求只返回响应头）
+            if self.command == 'HEAD':
+                return
+            if utf8_content is not None:
+                self.wfile.write(utf8_content[start:end + 1])
             else:
                 # 对于下载请求或二进制文件，直接发送原始内容
                 with open(file_path, 'rb') as f:
-                    # 分块发送，避免内存占用过大
-                    chunk_size = 8192
-                    while True:
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        self.wfile.write(chunk)
+                    self.copy_file_to_client(f, start, end - start + 1)
                     
-        except PermissionError:
-            self.send_error(403, "权限被拒绝")
         except Exception as e:
-            self.send_error(500, f"内部服务器错误: {str(e)}")
+            if headers_sent:
+                # 响应头已发送，无法再返回错误页面，只能关闭连接
+                self.close_connection = True
+            elif isinstance(e, PermissionError):
+                self.send_error(403, "权限被拒绝")
+            else:
+                self.send_error(500, f"内部服务器错误: {str(e)}")
+    
+    def is_not_modified(self, etag, mtime):
+        """检查条件请求头，判断客户端缓存是否仍然有效"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            # If-None-Match 优先于 If-Modified-Since，使用弱比较
+            opaque_tag = etag[2:] if etag.startswith('W/') else etag
+            for tag in if_none_match.split(','):
+                tag = tag.strip()
+                if tag == '*' or (tag[2:] if tag.startswith('W/') else tag) == opaque_tag:
+                    return True
+            return False
+        
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=datetime.timezone.utc)
+            return int(mtime) <= since.timestamp()
+        
+        return False
+    
+    def if_range_matches(self, last_modified):
+        """检查If-Range请求头，文件已变化时应忽略Range返回完整内容"""
+        if_range = self.headers.get('If-Range')
+        if not if_range:
+            return True
+        # If-Range 要求强校验器，弱ETag永远不能匹配，因此只比较Last-Modified
+        return if_range.strip() == last_modified
+    
+    def parse_range(self, range_header, size):
+        """解析Range请求头，返回 (start, end)，格式无效或不支持时返回None"""
+        match = _RANGE_RE.fullmatch(range_header.strip())
+        if not match:
+            return None
+        
+        start, end = match.groups()
+        if not start:
+            if not end:
+                return None
+            # 后缀范围 bytes=-N 表示最后N个字节
+            length = int(end)
+            if length == 0:
+                return size, size - 1
+            return max(size - length, 0), size - 1
+        
+        start = int(start)
+        if end:
+            if int(end) < start:
+                return None
+            return start, min(int(end), size - 1)
+        return start, size - 1
+    
+    def copy_file_to_client(self, f, offset, count):
+        """从offset处发送count字节的文件内容，优先使用内核零拷贝的sendfile"""
+        # 空文件无需发送内容（socket.sendfile 不接受 count 为0）
+        if count <= 0:
+            return
+        self.wfile.flush()
+        # socket.sendfile 在不支持 os.sendfile 的平台上会自动回退为普通发送
+        sent = self.connection.sendfile(f, offset, count)
+        if sent < count:
+            # 文件在发送过程中变小，实际内容短于Content-Length，只能关闭连接
+            self.close_connection = True
     
     def do_OPTIONS(self):
         """处理OPTIONS请求，支持CORS"""
@@ -506,25 +807,18 @@ class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
         self.send_header("Access-Control-Allow-Origin", "*")
         self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
         self.send_header("Access-Control-Allow-Headers", "*")
+        self.send_header("Content-Length", "0")
         self.end_headers()
     
     def format_size(self, size):
         """格式化文件大小"""
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if size < 1024.0:
-                return f"{size:.1f} {unit}"
-            size /= 1024.0
-        return f"{size:.1f} PB"
+        # 由整数位长度直接得到单位（每1024倍进一级），无需循环除法
+        index = min(max(size.bit_length() - 1, 0) // 10, len(SIZE_UNITS) - 1)
+        return f"{size / (1 << (index * 10)):.1f} {SIZE_UNITS[index]}"
     
     def html_escape(self, text):
         """HTML转义，防止XSS攻击"""
-        if not text:
-            return ""
-        return (text.replace('&', '&amp;')
-                    .replace('<', '&lt;')
-                    .replace('>', '&gt;')
-                    .replace('"', '&quot;')
-                    .replace("'", '&#39;'))
+        return text.translate(self._HTML_TRANS) if text else ""
     
     def log_message(self, format, *args):
         """自定义日志输出"""
@@ -537,7 +831,7 @@ class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
             # 如果编码有问题，使用安全的输出
             print(f"[{self.log_date_time_string()}] {client_ip} - Request logged")
     
-    def send_error(self, code, message=None):
+    def send_error(self, code, message=None, explain=None):
         """重写send_error方法，使用UTF-8编码"""
         if message is None:
             message = ""
@@ -548,11 +842,6 @@ class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
         except:
             message = "错误"
         
-        self.send_response(code)
-        self.send_header("Content-type", "text/html; charset=utf-8")
-        self.send_header('Connection', 'close')
-        self.end_headers()
-        
         error_html = f"""<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
@@ -569,14 +858,29 @@ class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
     <p><a href="/">返回首页</a></p>
 </body>
 </html>"""
+        error_body = error_html.encode('utf-8')
+        
+        # 请求行或请求头解析失败时剩余数据仍未读取，必须关闭连接，
+        # 否则剩余数据会被当作下一个请求处理；其他应用层错误保持长连接
+        if code in PROTOCOL_ERROR_CODES:
+            self.close_connection = True
+        
+        self.send_response(code)
+        self.send_header("Content-type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(error_body)))
+        self.end_headers()
+        
+        if self.command == 'HEAD':
+            return
         
         try:
-            self.wfile.write(error_html.encode('utf-8'))
+            self.wfile.write(error_body)
         except:
             pass
 
+@functools.lru_cache(maxsize=1)
 def get_local_ip():
-    """获取本机IP地址"""
+    """获取本机IP地址（结果在进程内缓存）"""
     try:
         # 创建一个临时socket来获取本机IP
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -612,10 +916,10 @@ def main():
     try:
         # 创建自定义Handler类，传入目录参数
         handler_class = lambda *args, **kwargs: CustomHTTPRequestHandler(
-            *args, directory=root_dir, **kwargs
+            *args, directory=root_dir, root_abs=root_dir, **kwargs
         )
         
-        server = HTTPServer((args.host, args.port), handler_class)
+        server = ThreadingHTTPServer((args.host, args.port), handler_class)
         
         # 获取本机IP
         local_ip = get_local_ip()
@@ -635,8 +939,8 @@ def main():
         print(f"   - 支持中文文件名")
         print(f"   - 支持跨域访问(CORS)")
         print("=" * 60)
-        print("📝 安装chardet库以获得更好的编码检测:")
-        print("   pip install chardet")
+        print("📝 安装cchardet库以获得更快的编码检测:")
+        print("   pip install cchardet")
         print("=" * 60)
         print("🛑 按 Ctrl+C 停止服务器")
         print("=" * 60)